@@ -0,0 +1,212 @@
+"""Local stand-in for the Gemini REST API used by the load-test harness.
+
+Run standalone:
+    python -m loadtest.fake_gemini --port 8100 --latency lognormal:0.8,0.5
+
+Point the backend at it with GEMINI_API_ENDPOINT=http://127.0.0.1:8100.
+"""
+import re
+import json
+import math
+import random
+import asyncio
+import argparse
+from typing import Dict, List, Any
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def parse_latency(spec: str):
+    """Build a latency sampler from a spec string
+
+    Supported: fixed:S, uniform:MIN,MAX, normal:MEAN,STDDEV,
+    lognormal:MEDIAN,SIGMA, exp:MEAN (all in seconds)
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == 'exp':
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def sample_invoice(rng: random.Random, index: int) -> Dict[str, Any]:
+    quantity = rng.randint(1, 10)
+    unit_price = round(rng.uniform(5, 500), 2)
+    tax = round(quantity * unit_price * 0.18, 2)
+    return {
+        "serial_number": f"INV-{index:05d}",
+        "customer_name": f"Customer {rng.randint(1, 50)}",
+        "product_name": f"Product {rng.randint(1, 100)}",
+        "quantity": quantity,
+        "tax": tax,
+        "total_amount": round(quantity * unit_price + tax, 2),
+        "date": "2024-01-15",
+        "discount": 0,
+        "payment_mode": "Cash",
+        "notes": "MISSING"
+    }
+
+
+def build_extraction(rng: random.Random, invoice_count: int, with_summary: bool) -> Dict[str, Any]:
+    """Build a plausible extraction result with aggregated products/customers"""
+    invoices = [sample_invoice(rng, i + 1) for i in range(invoice_count)]
+    products = {}
+    customers = {}
+    for invoice in invoices:
+        product = products.setdefault(invoice['product_name'], {
+            "name": invoice['product_name'], "quantity": 0,
+            "unit_price": 0, "tax": 0, "price_with_tax": 0, "discount": 0, "sku": "MISSING"
+        })
+        product['quantity'] += invoice['quantity']
+        product['tax'] += invoice['tax']
+        product['price_with_tax'] += invoice['total_amount']
+        product['unit_price'] = round((product['price_with_tax'] - product['tax']) / product['quantity'], 2)
+
+        customer = customers.setdefault(invoice['customer_name'], {
+            "customer_name": invoice['customer_name'], "phone_number": "MISSING",
+            "total_purchase_amount": 0, "email": "MISSING", "address": "MISSING"
+        })
+        customer['total_purchase_amount'] += invoice['total_amount']
+
+    data = {
+        "invoices": invoices,
+        "products": list(products.values()),
+        "customers": list(customers.values())
+    }
+    if with_summary:
+        total_amount = sum(i['total_amount'] for i in invoices)
+        total_tax = sum(i['tax'] for i in invoices)
+        data['summary'] = {
+            "total_quantity": sum(i['quantity'] for i in invoices),
+            "total_amount": total_amount,
+            "cgst": total_tax / 2,
+            "sgst": total_tax / 2,
+            "igst": 0,
+            "net_amount": total_amount - total_tax,
+            "total_tax": total_tax,
+            "extra_discount": 0,
+            "round_off": 0
+        }
+    return data
+
+
+def build_response_text(texts: List[str], rng: random.Random) -> str:
+    """Answer in the shape the calling prompt expects"""
+    joined = "\n".join(texts)
+
+    document_ids = re.findall(r'^DOCUMENT (\S+)$', joined, flags=re.MULTILINE)
+    if document_ids:
+        documents = []
+        for document_id in document_ids:
+            document = build_extraction(rng, rng.randint(1, 3), with_summary=False)
+            document['document_id'] = document_id
+            documents.append(document)
+        return json.dumps({"documents": documents})
+
+    if 'EXCEL DATA:' in joined:
+        rows = len(re.findall(r'^ROW \d+:', joined, flags=re.MULTILINE))
+        return json.dumps(build_extraction(rng, max(rows, 1), with_summary=True))
+
+    return "```json\n" + json.dumps(build_extraction(rng, rng.randint(1, 3), with_summary=False)) + "\n```"
+
+
+def create_app(
+    latency: str = 'fixed:0.2',
+    quota_burst_every: int = 0,
+    quota_burst_length: int = 0,
+    malformed_rate: float = 0.0,
+    seed: int = 0
+) -> FastAPI:
+    """Create the fake Gemini app
+
+    Every ``quota_burst_every`` requests, the last ``quota_burst_length`` of
+    them get a 429 RESOURCE_EXHAUSTED. Randomness is derived from the seed
+    and the request number so runs are repeatable.
+    """
+    app = FastAPI(title="Fake Gemini API")
+    sample_latency = parse_latency(latency)
+    stats = {"requests": 0, "ok": 0, "rate_limited": 0, "malformed": 0, "by_model": {}}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate_content(version: str, model_action: str, request: Request):
+        index = stats["requests"]
+        stats["requests"] += 1
+        model = model_action.split(':')[0]
+        stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+
+        rng = random.Random(seed * 1_000_003 + index)
+        await asyncio.sleep(sample_latency(rng))
+
+        if quota_burst_every and index % quota_burst_every >= quota_burst_every - quota_burst_length:
+            stats["rate_limited"] += 1
+            return JSONResponse(status_code=429, content={
+                "error": {
+                    "code": 429,
+                    "message": "Resource has been exhausted (e.g. check quota).",
+                    "status": "RESOURCE_EXHAUSTED"
+                }
+            })
+
+        body = await request.json()
+        texts = [
+            part['text']
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+            if 'text' in part
+        ]
+
+        if rng.random() < malformed_rate:
+            stats["malformed"] += 1
+            text = '{"invoices": [{"serial_number": "INV-1", "quantity": '
+        else:
+            stats["ok"] += 1
+            text = build_response_text(texts, rng)
+
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0
+            }]
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="fixed:0.2", help="e.g. fixed:0.2, uniform:0.1,0.5, lognormal:0.8,0.5")
+    parser.add_argument("--quota-burst-every", type=int, default=0, help="burst period in requests (0 disables)")
+    parser.add_argument("--quota-burst-length", type=int, default=0, help="429 responses per burst")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of responses with broken JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(
+        latency=args.latency,
+        quota_burst_every=args.quota_burst_every,
+        quota_burst_length=args.quota_burst_length,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Generate upload fixtures (Excel, PDF, image) for the load-test harness."""
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+
+def make_excel(path: str, rows: int, seed: int = 0) -> str:
+    """Write an invoice ledger with the headers parse_excel_manual understands"""
+    import openpyxl
+
+    rng = random.Random(seed)
+    # Normal mode writes the <dimension> element like Excel does; without it
+    # openpyxl's read-only reader scans the whole sheet before the first row
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Serial Number', 'Customer Name', 'Product Name', 'Qty', 'Unit Price',
+                  'Tax (%)', 'Price with Tax', 'Invoice Date', 'Payment Mode', 'Status'])
+
+    start = datetime(2024, 1, 1)
+    for i in range(rows):
+        qty = rng.randint(1, 10)
+        price = round(rng.uniform(5, 500), 2)
+        sheet.append([
+            f'INV-{i + 1:05d}',
+            f'Customer {rng.randint(1, 200)}',
+            f'Product {rng.randint(1, 500)}',
+            qty,
+            price,
+            18,
+            round(qty * price * 1.18, 2),
+            start + timedelta(days=rng.randint(0, 365)),
+            rng.choice(['Cash', 'UPI', 'Card']),
+            'Paid'
+        ])
+    sheet.append(['Totals', None, None, None, None, None, None, None, None, None])
+
+    workbook.save(path)
+    return path
+
+
+def make_pdf(path: str, seed: int = 0) -> str:
+    """Write a single-page invoice PDF"""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    page = doc.new_page()
+    lines = ["INVOICE INV-00001", "Customer: Customer 1", ""]
+    for i in range(rng.randint(3, 12)):
+        lines.append(f"Product {i + 1}    x{rng.randint(1, 5)}    {rng.uniform(5, 500):.2f}")
+    page.insert_text((72, 72), "\n".join(lines), fontsize=11)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_image(path: str, size=(800, 1100), seed: int = 0) -> str:
+    """Write a receipt-like image"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    y = 40
+    draw.text((40, y), "RECEIPT #0001", fill='black')
+    for i in range(rng.randint(3, 15)):
+        y += 30
+        draw.text((40, y), f"Item {i + 1}   x{rng.randint(1, 5)}   {rng.uniform(1, 99):.2f}", fill='black')
+    image.save(path)
+    return path
+
+
+def make_fixtures(directory: str, excel_rows: int, seed: int = 0) -> Dict[str, str]:
+    """Create one fixture per upload kind and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    return {
+        'excel': make_excel(os.path.join(directory, 'ledger.xlsx'), excel_rows, seed),
+        'pdf': make_pdf(os.path.join(directory, 'invoice.pdf'), seed),
+        'image': make_image(os.path.join(directory, 'receipt.png'), seed=seed),
+    }
@@ -0,0 +1,343 @@
+"""End-to-end load test for /api/upload against a local fake Gemini server.
+
+Starts the fake Gemini server and the FastAPI app as subprocesses, drives a
+mix of Excel/PDF/image uploads at each concurrency level and reports latency
+percentiles, error rates, fake-API call counts and per-process memory.
+
+Run from backend/:
+    python -m loadtest.run --concurrency 1,8,32 --requests 200 \\
+        --mix excel=0.4,pdf=0.3,image=0.3 --latency lognormal:0.8,0.5 \\
+        --quota-burst-every 50 --quota-burst-length 5 --malformed-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Any
+import httpx
+from loadtest.fixtures import make_fixtures
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MIME_TYPES = {
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+    'image': 'image/png',
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in MIME_TYPES:
+            raise ValueError(f"Unknown upload kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def wait_until_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise Exception(f"Server at {url} did not start within {timeout}s")
+
+
+def read_rss_kb(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def descendant_pids(root_pid: int) -> List[int]:
+    """Find all descendants of a process via /proc (Linux only)"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # ppid is the 2nd field after the ")" closing the command name
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    found = []
+    frontier = [root_pid]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def process_label(pid: int, app_pid: int) -> str:
+    if pid == app_pid:
+        return 'app'
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            if b'resource_tracker' in f.read():
+                return f'tracker {pid}'
+    except OSError:
+        pass
+    return f'worker {pid}'
+
+
+async def sample_memory(app_pid: int, peaks: Dict[int, int], stop: asyncio.Event, interval: float = 0.5) -> None:
+    """Track peak RSS of the app process and its pool workers"""
+    if not os.path.isdir('/proc'):
+        return
+    while not stop.is_set():
+        for pid in [app_pid] + descendant_pids(app_pid):
+            peaks[pid] = max(peaks.get(pid, 0), read_rss_kb(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(
+    base_url: str,
+    fixtures: Dict[str, bytes],
+    schedule: List[str],
+    concurrency: int,
+    timeout: float
+) -> List[Dict[str, Any]]:
+    """Send every upload in the schedule with a fixed number of concurrent clients"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for kind in schedule:
+        queue.put_nowait(kind)
+    records = []
+
+    async def client(http: httpx.AsyncClient):
+        while True:
+            try:
+                kind = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            filename = {'excel': 'ledger.xlsx', 'pdf': 'invoice.pdf', 'image': 'receipt.png'}[kind]
+            start = time.perf_counter()
+            try:
+                response = await http.post(
+                    f"{base_url}/api/upload",
+                    files={'file': (filename, fixtures[kind], MIME_TYPES[kind])}
+                )
+                status = response.status_code
+                body = response.json()
+                success = status == 200 and body.get('success', False)
+                message = body.get('message') or body.get('detail', '')
+            except (httpx.HTTPError, ValueError) as e:
+                status = type(e).__name__
+                success = False
+                message = str(e)
+            records.append({
+                'kind': kind,
+                'status': status,
+                'success': success,
+                'message': '' if success else str(message)[:120],
+                'latency': time.perf_counter() - start
+            })
+
+    async with httpx.AsyncClient(timeout=timeout) as http:
+        await asyncio.gather(*[client(http) for _ in range(concurrency)])
+    return records
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = [r['latency'] for r in records]
+    statuses = {}
+    for r in records:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+
+    failures = {}
+    for r in records:
+        if not r['success']:
+            failures[r['message']] = failures.get(r['message'], 0) + 1
+
+    by_kind = {}
+    for kind in sorted({r['kind'] for r in records}):
+        kind_records = [r for r in records if r['kind'] == kind]
+        kind_latencies = [r['latency'] for r in kind_records]
+        by_kind[kind] = {
+            'requests': len(kind_records),
+            'p50': percentile(kind_latencies, 50),
+            'p99': percentile(kind_latencies, 99),
+            'failure_rate': sum(1 for r in kind_records if not r['success']) / len(kind_records)
+        }
+
+    return {
+        'requests': len(records),
+        'elapsed': elapsed,
+        'throughput': len(records) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else 0.0,
+        'http_error_rate': sum(1 for r in records if r['status'] != 200) / len(records) if records else 0.0,
+        'failure_rate': sum(1 for r in records if not r['success']) / len(records) if records else 0.0,
+        'statuses': statuses,
+        'failures': dict(sorted(failures.items(), key=lambda item: -item[1])),
+        'by_kind': by_kind
+    }
+
+
+def print_report(level: int, summary: Dict[str, Any]) -> None:
+    print(f"\n=== concurrency {level}: {summary['requests']} requests in {summary['elapsed']:.1f}s "
+          f"({summary['throughput']:.2f} req/s) ===")
+    print(f"latency  p50 {summary['p50']:.3f}s  p90 {summary['p90']:.3f}s  "
+          f"p99 {summary['p99']:.3f}s  max {summary['max']:.3f}s")
+    print(f"errors   http {summary['http_error_rate']:.1%}  extraction failures {summary['failure_rate']:.1%}  "
+          f"statuses {summary['statuses']}")
+    for message, count in list(summary['failures'].items())[:3]:
+        print(f"  {count:>4}x {message}")
+    for kind, stats in summary['by_kind'].items():
+        print(f"  {kind:<6} n={stats['requests']:<5} p50 {stats['p50']:.3f}s  p99 {stats['p99']:.3f}s  "
+              f"failures {stats['failure_rate']:.1%}")
+    gemini = summary['gemini']
+    print(f"gemini   calls {gemini['requests']}  ok {gemini['ok']}  429 {gemini['rate_limited']}  "
+          f"malformed {gemini['malformed']}  by model {gemini['by_model']}")
+    for label, rss_kb in summary['memory_peak_kb'].items():
+        print(f"memory   {label:<14} peak RSS {rss_kb / 1024:.1f} MiB")
+
+
+async def drive(args, base_url: str, fake_url: str, app_pid: int, fixtures: Dict[str, bytes]) -> List[Dict[str, Any]]:
+    mix = parse_mix(args.mix)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    results = []
+
+    async with httpx.AsyncClient() as http:
+        for level in [int(c) for c in args.concurrency.split(',')]:
+            # Same seed per level so every level sees the same upload sequence
+            schedule = random.Random(args.seed).choices(kinds, weights=weights, k=args.requests)
+            gemini_before = (await http.get(f"{fake_url}/stats")).json()
+
+            peaks: Dict[int, int] = {}
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(sample_memory(app_pid, peaks, stop))
+
+            start = time.perf_counter()
+            records = await run_level(base_url, fixtures, schedule, level, args.timeout)
+            elapsed = time.perf_counter() - start
+
+            stop.set()
+            await sampler
+            gemini_after = (await http.get(f"{fake_url}/stats")).json()
+
+            summary = summarize(records, elapsed)
+            summary['concurrency'] = level
+            summary['gemini'] = {
+                key: gemini_after[key] - gemini_before[key]
+                for key in ['requests', 'ok', 'rate_limited', 'malformed']
+            }
+            summary['gemini']['by_model'] = {
+                model: count - gemini_before['by_model'].get(model, 0)
+                for model, count in gemini_after['by_model'].items()
+                if count - gemini_before['by_model'].get(model, 0)
+            }
+            summary['memory_peak_kb'] = {
+                process_label(pid, app_pid): rss
+                for pid, rss in peaks.items() if rss
+            }
+            print_report(level, summary)
+            results.append(summary)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/upload against a fake Gemini server")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="uploads per concurrency level")
+    parser.add_argument("--mix", default="excel=0.4,pdf=0.3,image=0.3", help="upload kind weights")
+    parser.add_argument("--excel-rows", type=int, default=200, help="rows in the Excel fixture")
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="fake Gemini latency distribution")
+    parser.add_argument("--quota-burst-every", type=int, default=0)
+    parser.add_argument("--quota-burst-length", type=int, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per upload in seconds")
+    parser.add_argument("--json", help="write the summaries to this file")
+    args = parser.parse_args()
+
+    fake_port = free_port()
+    app_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    base_url = f"http://127.0.0.1:{app_port}"
+
+    processes = []
+    try:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "loadtest.fake_gemini",
+            "--port", str(fake_port),
+            "--latency", args.latency,
+            "--quota-burst-every", str(args.quota_burst_every),
+            "--quota-burst-length", str(args.quota_burst_length),
+            "--malformed-rate", str(args.malformed_rate),
+            "--seed", str(args.seed)
+        ], cwd=BACKEND_DIR, stdout=subprocess.DEVNULL))
+        wait_until_ready(f"{fake_url}/stats")
+
+        env = dict(os.environ, GEMINI_API_KEY="loadtest", GEMINI_API_ENDPOINT=fake_url)
+        app_process = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"
+        ], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+        processes.append(app_process)
+        wait_until_ready(f"{base_url}/health")
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = make_fixtures(directory, args.excel_rows, args.seed)
+            fixtures = {}
+            for kind, path in paths.items():
+                with open(path, 'rb') as f:
+                    fixtures[kind] = f.read()
+
+        results = asyncio.run(drive(args, base_url, fake_url, app_process.pid, fixtures))
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,27 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
+import uuid
 from dotenv import load_dotenv
 from typing import Dict, List, Any
-from services.extract import process_file
+from services.extract import process_file, process_batch
+from services.executor import ExecutorBusyError, shutdown_pool
+from services.exporter import (
+    build_export,
+    spool_export_rows,
+    iter_spooled_rows,
+    remove_spooled_rows,
+    EXPORT_FIELDS,
+    EXPORT_FORMATS,
+)
+from services.streaming import (
+    stream_excel_extraction,
+    acquire_stream_slot,
+    release_stream_slot,
+    STREAM_FORMATS,
+)
+from starlette.background import BackgroundTask
 
 load_dotenv()
 app = FastAPI(title="Invoice Extraction API", version="1.0.0")
@@ -22,6 +39,10 @@ app.add_middleware(
 # Create uploads directory
 os.makedirs("uploads", exist_ok=True)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_pool()
+
 @app.get("/")
 async def root():
     return {
@@ -45,8 +66,8 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
                 detail=f"Unsupported file type: {file_ext}"
             )
         
-        # Save file temporarily
-        file_path = f"uploads/{file.filename}"
+        # Save file temporarily (unique prefix so concurrent uploads of the same name don't collide)
+        file_path = f"uploads/{uuid.uuid4().hex}_{os.path.basename(file.filename)}"
         content = await file.read()
         
         with open(file_path, "wb") as f:
@@ -59,6 +80,12 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
         
     except HTTPException:
         raise
+    except ExecutorBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     finally:
@@ -68,6 +95,139 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
             except:
                 pass
 
+@app.post("/api/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...)) -> JSONResponse:
+    """Upload and process several invoice files; small images/PDFs are packed into shared AI calls"""
+    saved_files = []
+    try:
+        # Validate file types
+        allowed_extensions = ['.xlsx', '.xls', '.pdf', '.png', '.jpg', '.jpeg']
+        for file in files:
+            file_ext = os.path.splitext(file.filename)[1].lower()
+            if file_ext not in allowed_extensions:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type: {file_ext} ({file.filename})"
+                )
+        
+        # Save files temporarily (unique prefix so same-named files don't collide)
+        for file in files:
+            file_path = f"uploads/{uuid.uuid4().hex}_{os.path.basename(file.filename)}"
+            content = await file.read()
+            
+            with open(file_path, "wb") as f:
+                f.write(content)
+            
+            saved_files.append({
+                "filename": file.filename,
+                "file_path": file_path,
+                "file_ext": os.path.splitext(file.filename)[1].lower()
+            })
+        
+        # Process files; a busy executor is reported per file in the results
+        result = await process_batch(saved_files)
+        
+        return JSONResponse(content=result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    finally:
+        for item in saved_files:
+            if os.path.exists(item["file_path"]):
+                try:
+                    os.remove(item["file_path"])
+                except:
+                    pass
+
+@app.post("/api/upload/stream")
+async def upload_stream(file: UploadFile = File(...), format: str = "ndjson") -> StreamingResponse:
+    """Stream a spreadsheet extraction (manual parsing) as NDJSON or chunked JSON"""
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    # openpyxl reads .xlsx only
+    if file_ext != '.xlsx':
+        raise HTTPException(
+            status_code=400,
+            detail=f"Streaming supports .xlsx files only, got: {file_ext}"
+        )
+    
+    stream_format = format.lower()
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {format}")
+    
+    # Streams parse in this process, so they are bounded separately from the pool
+    try:
+        acquire_stream_slot()
+    except ExecutorBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    file_path = f"uploads/{uuid.uuid4().hex}_{os.path.basename(file.filename)}"
+    try:
+        # Save file temporarily, copying in chunks rather than reading it whole
+        with open(file_path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                f.write(chunk)
+    except Exception as e:
+        await finish_stream(file_path)
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    
+    # Rows are produced by a sync generator, which Starlette iterates in a
+    # threadpool; the slot is released and the file removed once the
+    # response has been sent
+    return StreamingResponse(
+        stream_excel_extraction(file_path, stream_format),
+        media_type=STREAM_FORMATS[stream_format],
+        background=BackgroundTask(finish_stream, file_path)
+    )
+
+async def finish_stream(file_path: str) -> None:
+    release_stream_slot()
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except:
+            pass
+
+@app.post("/api/export/{entity}")
+async def export_data(entity: str, request: Request, format: str = "xlsx") -> StreamingResponse:
+    """Stream invoices, products or customers (or "all") as XLSX, CSV or NDJSON"""
+    entities = list(EXPORT_FIELDS) if entity == "all" else [entity]
+    export_format = format.lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    for name in entities:
+        if name not in EXPORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unsupported export entity: {name}")
+    if export_format == "csv" and len(entities) != 1:
+        raise HTTPException(status_code=400, detail="CSV export supports one entity at a time")
+    
+    # The NDJSON body is validated line by line into temp files, so bad rows
+    # get a 422 before any bytes are streamed and memory does not grow with
+    # the number of rows
+    try:
+        spooled = await spool_export_rows(request.stream(), entities)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    sections = {name: iter_spooled_rows(path) for name, path in spooled.items()}
+    try:
+        body, media_type, extension = build_export(sections, export_format)
+    except ValueError as e:
+        remove_spooled_rows(spooled)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="invoice-data-{entity}{extension}"'},
+        background=BackgroundTask(remove_spooled_rows, spooled)
+    )
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
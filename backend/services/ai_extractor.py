@@ -3,21 +3,29 @@ load_dotenv()
 
 import os
 import json
+import asyncio
 from typing import Dict, List, Any
 import google.generativeai as genai
 from PIL import Image
 import io
+from services.executor import run_cpu_bound, ExecutorBusyError
 
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Optional override, e.g. the local fake server used by loadtest/
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=GEMINI_API_KEY,
+            transport="rest",
+            client_options={"api_endpoint": GEMINI_API_ENDPOINT}
+        )
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
 
-EXTRACTION_PROMPT = """
-Extract ALL invoice data from this document and return ONLY valid JSON:
-
-{
-  "invoices": [
+# Field schema and rules shared by the single-file and packed prompts
+EXTRACTION_FIELDS = """  "invoices": [
     {
       "serial_number": "invoice number or INV-001",
       "customer_name": "customer name",
@@ -50,14 +58,22 @@ Extract ALL invoice data from this document and return ONLY valid JSON:
       "email": "email or MISSING",
       "address": "address or MISSING"
     }
-  ]
-}
+  ]"""
 
-Rules:
-- Extract ALL invoices/line items
+EXTRACTION_RULES = """- Extract ALL invoices/line items
 - Use "MISSING" for unavailable fields
 - Return ONLY JSON, no markdown
-- All numbers must be numeric
+- All numbers must be numeric"""
+
+EXTRACTION_PROMPT = f"""
+Extract ALL invoice data from this document and return ONLY valid JSON:
+
+{{
+{EXTRACTION_FIELDS}
+}}
+
+Rules:
+{EXTRACTION_RULES}
 """
 
 async def extract_with_ai(file_path: str, file_type: str) -> Dict[str, List[Dict[str, Any]]]:
@@ -67,8 +83,9 @@ async def extract_with_ai(file_path: str, file_type: str) -> Dict[str, List[Dict
             raise Exception("GEMINI_API_KEY not set")
         
         model = genai.GenerativeModel('gemini-2.5-flash')
-        image = load_file_as_image(file_path, file_type)
-        response = model.generate_content([EXTRACTION_PROMPT, image])
+        # PDF rendering and image decoding are CPU-bound, run them off the event loop
+        image = await run_cpu_bound(load_file_as_image_part, file_path, file_type)
+        response = await asyncio.to_thread(model.generate_content, [EXTRACTION_PROMPT, image])
         
         response_text = response.text.strip()
         response_text = clean_json_response(response_text)
@@ -79,6 +96,8 @@ async def extract_with_ai(file_path: str, file_type: str) -> Dict[str, List[Dict
         
         return extracted_data
         
+    except ExecutorBusyError:
+        raise
     except json.JSONDecodeError as e:
         raise Exception(f"AI returned invalid JSON: {str(e)}")
     except Exception as e:
@@ -107,6 +126,24 @@ def load_file_as_image(file_path: str, file_type: str) -> Image.Image:
     except Exception as e:
         raise Exception(f"Failed to load file: {str(e)}")
 
+def load_file_as_image_part(file_path: str, file_type: str) -> Dict[str, Any]:
+    """Load PDF or image and encode it as an inline blob for Gemini"""
+    return encode_image_part(load_file_as_image(file_path, file_type), file_type)
+
+def encode_image_part(image: Image.Image, file_type: str) -> Dict[str, Any]:
+    """Encode a loaded image as an inline blob for Gemini"""
+    # Keep JPEG sources as JPEG to avoid inflating the payload
+    if file_type in ['.jpg', '.jpeg']:
+        image_format, mime_type = 'JPEG', 'image/jpeg'
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    else:
+        image_format, mime_type = 'PNG', 'image/png'
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return {'mime_type': mime_type, 'data': buffer.getvalue()}
+
 def clean_json_response(text: str) -> str:
     """Clean AI response"""
     if '```json' in text:
@@ -0,0 +1,224 @@
+import os
+import json
+import math
+import asyncio
+import textwrap
+from typing import Dict, List, Any, Optional
+import google.generativeai as genai
+from services.ai_extractor import (
+    GEMINI_API_KEY,
+    EXTRACTION_FIELDS,
+    EXTRACTION_RULES,
+    extract_with_ai,
+    load_file_as_image,
+    encode_image_part,
+    clean_json_response,
+    validate_structure,
+    normalize_data,
+)
+from services.executor import run_cpu_bound, ExecutorBusyError, EXECUTOR_MAX_WORKERS
+
+# Packing limits
+PACK_SMALL_FILE_MAX_BYTES = int(os.getenv("PACK_SMALL_FILE_MAX_BYTES", 2 * 1024 * 1024))
+PACK_MAX_DOCUMENTS = int(os.getenv("PACK_MAX_DOCUMENTS", 8))
+PACK_MAX_PAYLOAD_BYTES = int(os.getenv("PACK_MAX_PAYLOAD_BYTES", 15 * 1024 * 1024))
+PACK_MAX_INPUT_TOKENS = int(os.getenv("PACK_MAX_INPUT_TOKENS", 32000))
+PACK_MAX_OUTPUT_TOKENS = int(os.getenv("PACK_MAX_OUTPUT_TOKENS", 8192))
+PACK_OUTPUT_TOKENS_PER_DOCUMENT = int(os.getenv("PACK_OUTPUT_TOKENS_PER_DOCUMENT", 1024))
+
+# Gemini bills images as 258 tokens per 768x768 tile
+IMAGE_TILE_SIZE = 768
+IMAGE_TILE_TOKENS = 258
+
+PACKED_EXTRACTION_PROMPT = f"""
+You will receive several separate invoice/receipt documents. Each document is preceded
+by a label line "DOCUMENT <id>". Extract ALL invoice data from EACH document independently
+and return ONLY valid JSON:
+
+{{
+  "documents": [
+    {{
+      "document_id": "the <id> from the label",
+{textwrap.indent(EXTRACTION_FIELDS, '    ')}
+    }}
+  ]
+}}
+
+Rules:
+- Return exactly one entry in "documents" for every labeled document
+- Never merge data from different documents
+{EXTRACTION_RULES}
+"""
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Count pages in a PDF"""
+    try:
+        import fitz
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    except ImportError:
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(file_path)["Pages"])
+
+
+def prepare_document(file_path: str, file_type: str) -> Dict[str, Any]:
+    """Render a document for packing and estimate its request cost"""
+    pages = count_pdf_pages(file_path) if file_type == '.pdf' else 1
+    if pages > 1:
+        return {'pages': pages}
+
+    image = load_file_as_image(file_path, file_type)
+    part = encode_image_part(image, file_type)
+    width, height = image.size
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+
+    return {
+        'pages': pages,
+        'part': part,
+        'payload_bytes': len(part['data']),
+        'input_tokens': tiles * IMAGE_TILE_TOKENS,
+    }
+
+
+def is_packable(file_path: str, file_ext: str) -> bool:
+    """Small images and PDFs are candidates for packing"""
+    return (
+        file_ext in ['.pdf', '.png', '.jpg', '.jpeg']
+        and os.path.getsize(file_path) <= PACK_SMALL_FILE_MAX_BYTES
+    )
+
+
+def fits_in_pack(document: Dict[str, Any]) -> bool:
+    """Whether a prepared document is within the per-request limits on its own"""
+    return (
+        document['payload_bytes'] <= PACK_MAX_PAYLOAD_BYTES
+        and document['input_tokens'] <= PACK_MAX_INPUT_TOKENS
+    )
+
+
+def plan_packs(documents: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Greedily group prepared documents so each pack stays within request limits
+
+    Every document must pass ``fits_in_pack``.
+    """
+    max_documents = max(1, min(PACK_MAX_DOCUMENTS, PACK_MAX_OUTPUT_TOKENS // PACK_OUTPUT_TOKENS_PER_DOCUMENT))
+
+    packs = []
+    current = []
+    payload_bytes = 0
+    input_tokens = 0
+
+    for document in documents:
+        fits = (
+            len(current) < max_documents
+            and payload_bytes + document['payload_bytes'] <= PACK_MAX_PAYLOAD_BYTES
+            and input_tokens + document['input_tokens'] <= PACK_MAX_INPUT_TOKENS
+        )
+        if current and not fits:
+            packs.append(current)
+            current, payload_bytes, input_tokens = [], 0, 0
+
+        current.append(document)
+        payload_bytes += document['payload_bytes']
+        input_tokens += document['input_tokens']
+
+    if current:
+        packs.append(current)
+    return packs
+
+
+async def extract_pack(pack: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Extract several documents with a single model call, keyed by document id"""
+    if not GEMINI_API_KEY:
+        raise Exception("GEMINI_API_KEY not set")
+
+    contents = [PACKED_EXTRACTION_PROMPT]
+    for document in pack:
+        contents.append(f"DOCUMENT {document['id']}")
+        contents.append(document['part'])
+
+    model = genai.GenerativeModel('gemini-2.5-flash')
+    response = await asyncio.to_thread(model.generate_content, contents)
+
+    response_text = clean_json_response(response.text.strip())
+    packed_data = json.loads(response_text)
+
+    results = {}
+    for entry in packed_data.get('documents', []):
+        document_id = str(entry.pop('document_id', ''))
+        results[document_id] = normalize_data(validate_structure(entry))
+    return results
+
+
+async def extract_batch_with_ai(files: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Extract many small images/PDFs, packing them into as few model calls as possible
+
+    Each item of ``files`` has ``file_path`` and ``file_ext``. Returns one
+    extraction result (or an ``error`` entry, including when the executor
+    is busy) per file, in input order.
+    """
+    results: List[Dict[str, Any]] = [None] * len(files)
+    # Use every worker for rendering without filling the executor queue
+    render_slots = asyncio.Semaphore(EXECUTOR_MAX_WORKERS)
+
+    async def prepare(index: int, item: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        async with render_slots:
+            try:
+                prepared = await run_cpu_bound(prepare_document, item['file_path'], item['file_ext'])
+            except ExecutorBusyError as e:
+                # Reported per file so the rest of the batch still goes ahead
+                results[index] = {'error': str(e)}
+                return None
+            except Exception as e:
+                results[index] = {'error': f"Failed to load file: {str(e)}"}
+                return None
+        prepared['id'] = f"DOC-{index + 1}"
+        prepared['index'] = index
+        return prepared
+
+    prepared_documents = await asyncio.gather(*[
+        prepare(index, item)
+        for index, item in enumerate(files)
+        if is_packable(item['file_path'], item['file_ext'])
+    ])
+
+    # Multi-page PDFs and documents too large to share a request go one per call
+    packable = [
+        document for document in prepared_documents
+        if document is not None and document['pages'] == 1 and fits_in_pack(document)
+    ]
+
+    for pack in plan_packs(packable):
+        print(f"DEBUG: Extracting pack of {len(pack)} documents in one call...")
+        try:
+            pack_results = await extract_pack(pack)
+        except Exception as e:
+            error_msg = str(e).lower()
+            # Retrying a rate-limited pack file by file would only use more quota
+            if 'quota' in error_msg or 'rate limit' in error_msg or '429' in error_msg:
+                print(f"DEBUG: Packed extraction rate limited ({str(e)})")
+                for document in pack:
+                    results[document['index']] = {'error': f"AI extraction failed: {str(e)}"}
+            else:
+                # Bad or unparseable response: the documents fall through to
+                # one call per file below
+                print(f"DEBUG: Packed extraction failed ({str(e)}), extracting documents alone...")
+            continue
+
+        for document in pack:
+            if document['id'] in pack_results:
+                results[document['index']] = pack_results[document['id']]
+            else:
+                print(f"DEBUG: {document['id']} missing from packed response, extracting alone...")
+
+    # Large files, multi-page PDFs and documents the model dropped go one per call
+    for index, item in enumerate(files):
+        if results[index] is not None:
+            continue
+        try:
+            results[index] = await extract_with_ai(item['file_path'], item['file_ext'])
+        except Exception as e:
+            results[index] = {'error': str(e)}
+
+    return results
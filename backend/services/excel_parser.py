@@ -3,15 +3,25 @@ load_dotenv()
 
 import os
 import json
-import time
+import asyncio
 import google.generativeai as genai
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Tuple
 from datetime import datetime
+from services.executor import run_cpu_bound, ExecutorBusyError
 
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Optional override, e.g. the local fake server used by loadtest/
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=GEMINI_API_KEY,
+            transport="rest",
+            client_options={"api_endpoint": GEMINI_API_ENDPOINT}
+        )
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
 
 EXCEL_EXTRACTION_PROMPT = """
 You are an expert at extracting invoice data from Excel spreadsheets.
@@ -78,34 +88,38 @@ CRITICAL RULES:
 9. Return ONLY JSON, no markdown, no explanations
 """
 
-def parse_excel(file_path: str) -> dict:
+async def parse_excel(file_path: str) -> dict:
     """Parse Excel with AI fallback to manual parsing"""
     try:
         # Try AI parsing with retry logic
-        return parse_excel_with_ai(file_path)
+        return await parse_excel_with_ai(file_path)
+    except ExecutorBusyError:
+        raise
     except Exception as e:
         error_msg = str(e).lower()
         
         # If rate limit or quota error, fall back to manual parsing
         if 'quota' in error_msg or 'rate limit' in error_msg or '429' in error_msg:
             print("DEBUG: Rate limit hit, falling back to manual parsing...")
-            return parse_excel_manual(file_path)
+            return await run_cpu_bound(parse_excel_manual, file_path)
         
         # For other errors, try manual parsing as fallback
         print(f"DEBUG: AI parsing failed ({str(e)}), trying manual parsing...")
         try:
-            return parse_excel_manual(file_path)
+            return await run_cpu_bound(parse_excel_manual, file_path)
+        except ExecutorBusyError:
+            raise
         except Exception as manual_error:
             raise Exception(f"Both AI and manual parsing failed. AI: {str(e)}, Manual: {str(manual_error)}")
 
 
-def parse_excel_with_ai(file_path: str, max_retries: int = 2) -> dict:
+async def parse_excel_with_ai(file_path: str, max_retries: int = 2) -> dict:
     """Use Gemini AI to parse Excel file with retry logic"""
     if not GEMINI_API_KEY:
         raise Exception("GEMINI_API_KEY not set")
     
-    # Convert Excel to text
-    excel_text = convert_excel_to_text(file_path)
+    # Convert Excel to text (workbook loading is CPU-bound, run it off the event loop)
+    excel_text = await run_cpu_bound(convert_excel_to_text, file_path)
     print(f"DEBUG: Excel text preview:\n{excel_text[:500]}...")
     
     # Try different models in order of preference
@@ -123,7 +137,7 @@ def parse_excel_with_ai(file_path: str, max_retries: int = 2) -> dict:
                 print(f"DEBUG: Trying {model_name} (attempt {attempt + 1}/{max_retries})...")
                 
                 model = genai.GenerativeModel(model_name)
-                response = model.generate_content([EXCEL_EXTRACTION_PROMPT, excel_text])
+                response = await asyncio.to_thread(model.generate_content, [EXCEL_EXTRACTION_PROMPT, excel_text])
                 
                 response_text = response.text.strip()
                 response_text = clean_json_response(response_text)
@@ -145,7 +159,7 @@ def parse_excel_with_ai(file_path: str, max_retries: int = 2) -> dict:
                     if attempt < max_retries - 1:
                         wait_time = (2 ** attempt) * 5  # Exponential backoff: 5s, 10s
                         print(f"DEBUG: Rate limit hit, waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                         continue
                     else:
                         print(f"DEBUG: Rate limit persists after retries, trying next model...")
@@ -159,82 +173,95 @@ def parse_excel_with_ai(file_path: str, max_retries: int = 2) -> dict:
     raise last_error if last_error else Exception("AI parsing failed")
 
 
+# Header mappings for manual parsing
+HEADER_MAP = {
+    'serial number': 'serial_number',
+    'serial no': 'serial_number',
+    'invoice number': 'serial_number',
+    'invoice no': 'serial_number',
+    'customer name': 'customer_name',
+    'customer': 'customer_name',
+    'party name': 'customer_name',
+    'party company name': 'customer_company',
+    'product name': 'product_name',
+    'product': 'product_name',
+    'item': 'product_name',
+    'quantity': 'quantity',
+    'qty': 'quantity',
+    'tax': 'tax',
+    'tax (%)': 'tax_percent',
+    'total': 'total_amount',
+    'total amount': 'total_amount',
+    'item total amount': 'total_amount',
+    'price with tax': 'total_amount',
+    'date': 'date',
+    'invoice date': 'date',
+    'price': 'unit_price',
+    'unit price': 'unit_price',
+    'discount': 'discount',
+    'item discount': 'discount',
+    'payment mode': 'payment_mode',
+    'status': 'status',
+}
+
+
 def parse_excel_manual(file_path: str) -> Dict[str, List[Dict[str, Any]]]:
     """Manual Excel parsing as fallback"""
-    import openpyxl
-    
     print("DEBUG: Using manual Excel parsing...")
     
     try:
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
+        invoices = []
+        aggregates = new_aggregates()
+        
+        for invoice, unit_price in iter_excel_invoices(file_path):
+            invoices.append(invoice)
+            add_to_aggregates(aggregates, invoice, unit_price)
+        
+        print(f"DEBUG: Manual parsing complete - {len(invoices)} invoices")
+        
+        return {
+            'invoices': invoices,
+            **finish_aggregates(aggregates)
+        }
+        
+    except Exception as e:
+        raise Exception(f"Manual Excel parsing error: {str(e)}")
+
+
+def iter_excel_invoices(file_path: str) -> Iterator[Tuple[Dict[str, Any], float]]:
+    """Yield (invoice, unit_price) for each line item, reading the workbook row by row"""
+    import openpyxl
+    
+    # Read-only mode streams rows from the file instead of loading every cell
+    workbook = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+    try:
         sheet = workbook.active
+        # Ignore the declared <dimension>, which can be wrong, so rows are
+        # read to the end of the sheet data instead of stopping at its size.
+        # This does not scan anything; openpyxl already parsed the whole
+        # sheet on load if the file has no <dimension> at all
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
         
         # Get headers
         headers = []
-        for cell in sheet[1]:
-            if cell.value:
-                headers.append(str(cell.value).strip().lower())
-        
-        # Header mappings
-        header_map = {
-            'serial number': 'serial_number',
-            'serial no': 'serial_number',
-            'invoice number': 'serial_number',
-            'invoice no': 'serial_number',
-            'customer name': 'customer_name',
-            'customer': 'customer_name',
-            'party name': 'customer_name',
-            'party company name': 'customer_company',
-            'product name': 'product_name',
-            'product': 'product_name',
-            'item': 'product_name',
-            'quantity': 'quantity',
-            'qty': 'quantity',
-            'tax': 'tax',
-            'tax (%)': 'tax_percent',
-            'total': 'total_amount',
-            'total amount': 'total_amount',
-            'item total amount': 'total_amount',
-            'price with tax': 'total_amount',
-            'date': 'date',
-            'invoice date': 'date',
-            'price': 'unit_price',
-            'unit price': 'unit_price',
-            'discount': 'discount',
-            'item discount': 'discount',
-            'payment mode': 'payment_mode',
-            'status': 'status',
-        }
+        for value in next(rows, ()):
+            if value:
+                headers.append(str(value).strip().lower())
         
         # Normalize headers
-        normalized_headers = [header_map.get(h, h.replace(' ', '_')) for h in headers]
+        normalized_headers = [HEADER_MAP.get(h, h.replace(' ', '_')) for h in headers]
         
         print(f"DEBUG: Headers: {normalized_headers}")
         
-        # Extract data
-        invoices = []
-        products_map = {}
-        customers_map = {}
-        summary = {
-            'total_quantity': 0,
-            'total_amount': 0,
-            'cgst': 0,
-            'sgst': 0,
-            'igst': 0,
-            'net_amount': 0,
-            'total_tax': 0,
-            'extra_discount': 0,
-            'round_off': 0
-        }
-        
-        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+        for row_idx, row in enumerate(rows, start=2):
             if not any(row):
                 continue
             
+            # Read-only rows stop at the last filled cell; pad so blank cells read as None
             row_data = {}
-            for idx, value in enumerate(row):
-                if idx < len(normalized_headers):
-                    row_data[normalized_headers[idx]] = value
+            for idx, header in enumerate(normalized_headers):
+                row_data[header] = row[idx] if idx < len(row) else None
             
             serial = row_data.get('serial_number')
             
@@ -272,7 +299,6 @@ def parse_excel_manual(file_path: str) -> Dict[str, List[Dict[str, Any]]]:
             if unit_price == 0 and total_amount > 0 and qty > 0:
                 unit_price = (total_amount - tax) / qty
             
-            # Create invoice
             invoice = {
                 'serial_number': serial_number,
                 'customer_name': customer_name,
@@ -285,56 +311,88 @@ def parse_excel_manual(file_path: str) -> Dict[str, List[Dict[str, Any]]]:
                 'payment_mode': str(row_data.get('payment_mode', 'MISSING')),
                 'notes': str(row_data.get('status', 'MISSING'))
             }
-            invoices.append(invoice)
-            
-            # Update summary
-            summary['total_quantity'] += qty
-            summary['total_amount'] += total_amount
-            summary['total_tax'] += tax
-            
-            # Aggregate products
-            if product_name != 'MISSING':
-                if product_name not in products_map:
-                    products_map[product_name] = {
-                        'name': product_name,
-                        'quantity': qty,
-                        'unit_price': unit_price,
-                        'tax': tax,
-                        'price_with_tax': total_amount,
-                        'discount': discount,
-                        'sku': 'MISSING'
-                    }
-                else:
-                    products_map[product_name]['quantity'] += qty
-                    products_map[product_name]['price_with_tax'] += total_amount
-                    products_map[product_name]['tax'] += tax
-            
-            # Aggregate customers
-            if customer_name != 'MISSING':
-                if customer_name not in customers_map:
-                    customers_map[customer_name] = {
-                        'customer_name': customer_name,
-                        'phone_number': 'MISSING',
-                        'total_purchase_amount': total_amount,
-                        'email': 'MISSING',
-                        'address': 'MISSING'
-                    }
-                else:
-                    customers_map[customer_name]['total_purchase_amount'] += total_amount
-        
-        summary['net_amount'] = summary['total_amount'] - summary['total_tax']
-        
-        print(f"DEBUG: Manual parsing complete - {len(invoices)} invoices")
-        
-        return {
-            'invoices': invoices,
-            'products': list(products_map.values()),
-            'customers': list(customers_map.values()),
-            'summary': summary
+            yield invoice, unit_price
+    finally:
+        workbook.close()
+
+
+def new_aggregates() -> Dict[str, Any]:
+    """Running totals for products, customers and the summary"""
+    return {
+        'products': {},
+        'customers': {},
+        'summary': {
+            'total_quantity': 0,
+            'total_amount': 0,
+            'cgst': 0,
+            'sgst': 0,
+            'igst': 0,
+            'net_amount': 0,
+            'total_tax': 0,
+            'extra_discount': 0,
+            'round_off': 0
         }
-        
-    except Exception as e:
-        raise Exception(f"Manual Excel parsing error: {str(e)}")
+    }
+
+
+def add_to_aggregates(aggregates: Dict[str, Any], invoice: Dict[str, Any], unit_price: float) -> None:
+    """Fold one invoice line into the running totals"""
+    products_map = aggregates['products']
+    customers_map = aggregates['customers']
+    summary = aggregates['summary']
+    
+    product_name = invoice['product_name']
+    customer_name = invoice['customer_name']
+    qty = invoice['quantity']
+    tax = invoice['tax']
+    total_amount = invoice['total_amount']
+    
+    # Update summary
+    summary['total_quantity'] += qty
+    summary['total_amount'] += total_amount
+    summary['total_tax'] += tax
+    
+    # Aggregate products
+    if product_name != 'MISSING':
+        if product_name not in products_map:
+            products_map[product_name] = {
+                'name': product_name,
+                'quantity': qty,
+                'unit_price': unit_price,
+                'tax': tax,
+                'price_with_tax': total_amount,
+                'discount': invoice['discount'],
+                'sku': 'MISSING'
+            }
+        else:
+            products_map[product_name]['quantity'] += qty
+            products_map[product_name]['price_with_tax'] += total_amount
+            products_map[product_name]['tax'] += tax
+    
+    # Aggregate customers
+    if customer_name != 'MISSING':
+        if customer_name not in customers_map:
+            customers_map[customer_name] = {
+                'customer_name': customer_name,
+                'phone_number': 'MISSING',
+                'total_purchase_amount': total_amount,
+                'email': 'MISSING',
+                'address': 'MISSING'
+            }
+        else:
+            customers_map[customer_name]['total_purchase_amount'] += total_amount
+
+
+def finish_aggregates(aggregates: Dict[str, Any]) -> Dict[str, Any]:
+    """Return products, customers and summary from the running totals"""
+    summary = aggregates['summary']
+    summary['net_amount'] = summary['total_amount'] - summary['total_tax']
+    
+    return {
+        'products': list(aggregates['products'].values()),
+        'customers': list(aggregates['customers'].values()),
+        'summary': summary
+    }
 
 
 def convert_excel_to_text(file_path: str) -> str:
@@ -0,0 +1,175 @@
+import os
+import signal
+import asyncio
+import weakref
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+# Executor configuration
+EXECUTOR_MAX_WORKERS = int(os.getenv("EXECUTOR_MAX_WORKERS", os.cpu_count() or 2))
+EXECUTOR_MAX_QUEUE = int(os.getenv("EXECUTOR_MAX_QUEUE", 8))
+EXECUTOR_TASK_TIMEOUT = float(os.getenv("EXECUTOR_TASK_TIMEOUT", 120))
+# Total tasks a pool runs before all of its workers are replaced
+EXECUTOR_RECYCLE_AFTER_TASKS = int(os.getenv("EXECUTOR_RECYCLE_AFTER_TASKS", 20 * EXECUTOR_MAX_WORKERS))
+EXECUTOR_RETRY_AFTER = int(os.getenv("EXECUTOR_RETRY_AFTER", 5))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_tasks = 0
+_in_flight = 0
+
+# Tasks are only submitted when a worker is free, so the timeout measures
+# run time and never time spent waiting in the queue
+_running = asyncio.Semaphore(EXECUTOR_MAX_WORKERS)
+
+# Workers report which task they picked up so a hung task's worker can be
+# killed on its own
+_context = multiprocessing.get_context("spawn")
+_task_ids = itertools.count()
+_task_pids = {}
+# Reports for tasks that already finished are dropped so _task_pids stays bounded
+_active_task_ids = set()
+_pid_queue = None
+_worker_pid_queue = None
+
+# Pools whose worker was killed for a timeout; their other tasks are retried
+_killed_pools = weakref.WeakSet()
+
+
+class ExecutorBusyError(Exception):
+    """Raised when the process pool queue is full"""
+
+    def __init__(self, retry_after: int = EXECUTOR_RETRY_AFTER):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Return the process pool, creating or recycling it as needed"""
+    global _pool, _pool_tasks, _pid_queue
+
+    # Workers are replaced after a fixed number of tasks so memory held by
+    # openpyxl / PyMuPDF does not accumulate in long-lived processes. The
+    # whole pool is swapped because ProcessPoolExecutor's own
+    # max_tasks_per_child can leave queued tasks hanging when a worker exits.
+    if _pool is not None and _pool_tasks >= EXECUTOR_RECYCLE_AFTER_TASKS:
+        print("DEBUG: Recycling executor workers...")
+        _pool.shutdown(wait=False)
+        _pool = None
+
+    if _pool is None:
+        if _pid_queue is None:
+            _pid_queue = _context.Queue()
+        _pool = ProcessPoolExecutor(
+            max_workers=EXECUTOR_MAX_WORKERS,
+            mp_context=_context,
+            initializer=_init_worker,
+            initargs=(_pid_queue,),
+        )
+        _pool_tasks = 0
+
+    _pool_tasks += 1
+    return _pool
+
+
+def _init_worker(pid_queue) -> None:
+    global _worker_pid_queue
+    _worker_pid_queue = pid_queue
+
+
+def _run_task(task_id: int, func: Callable[..., Any], *args: Any) -> Any:
+    """Worker-side wrapper: report (task id, pid) before running the task"""
+    _worker_pid_queue.put((task_id, os.getpid()))
+    return func(*args)
+
+
+def _find_task_pid(task_id: int) -> Optional[int]:
+    """Collect reported pids and return the one running the given task"""
+    while True:
+        try:
+            reported_id, pid = _pid_queue.get_nowait()
+        except Exception:
+            break
+        if reported_id in _active_task_ids:
+            _task_pids[reported_id] = pid
+    return _task_pids.get(task_id)
+
+
+def kill_task_worker(pool: ProcessPoolExecutor, task_id: int) -> None:
+    """Kill the worker running a hung task and replace the pool
+
+    ProcessPoolExecutor marks the whole pool broken when any worker dies,
+    so the other tasks still running in it are retried on the new pool.
+    """
+    global _pool
+    _killed_pools.add(pool)
+    if _pool is pool:
+        _pool = None
+
+    pid = _find_task_pid(task_id)
+    if pid is not None:
+        pids = [pid]
+    else:
+        # Pid not reported yet; fall back to killing every worker in the pool
+        pids = list(getattr(pool, "_processes", None) or {})
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool() -> None:
+    """Stop the process pool on app shutdown"""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    """Run a CPU-bound function in the process pool without blocking the event loop"""
+    global _in_flight, _pool
+
+    # Backpressure: running tasks plus queued tasks may not exceed the limit
+    if _in_flight >= EXECUTOR_MAX_WORKERS + EXECUTOR_MAX_QUEUE:
+        print(f"DEBUG: Executor saturated ({_in_flight} tasks in flight), rejecting {func.__name__}")
+        raise ExecutorBusyError()
+
+    timeout = EXECUTOR_TASK_TIMEOUT if timeout is None else timeout
+    _in_flight += 1
+    try:
+        async with _running:
+            # One retry for tasks whose worker was killed because of another task
+            for attempt in range(2):
+                pool = get_pool()
+                task_id = next(_task_ids)
+                _active_task_ids.add(task_id)
+                future = pool.submit(_run_task, task_id, func, *args)
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+                except asyncio.TimeoutError:
+                    print(f"DEBUG: {func.__name__} exceeded {timeout}s, killing its worker...")
+                    kill_task_worker(pool, task_id)
+                    raise Exception(f"{func.__name__} timed out after {timeout}s")
+                except BrokenProcessPool:
+                    if pool in _killed_pools and attempt == 0:
+                        print(f"DEBUG: Worker pool replaced during {func.__name__}, retrying...")
+                        continue
+                    # A worker died (e.g. killed for memory); start fresh next time
+                    print(f"DEBUG: Worker crashed during {func.__name__}, recycling workers...")
+                    if _pool is pool:
+                        _pool = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise Exception(f"{func.__name__} failed: worker process crashed")
+                finally:
+                    # Drain reports so the queue does not back up; this
+                    # task's own report is dropped even if it arrives late
+                    _active_task_ids.discard(task_id)
+                    _find_task_pid(task_id)
+                    _task_pids.pop(task_id, None)
+    finally:
+        _in_flight -= 1
@@ -0,0 +1,307 @@
+import os
+import io
+import csv
+import json
+import re
+import math
+import asyncio
+import zipfile
+import tempfile
+from xml.sax.saxutils import escape
+from typing import Dict, List, Any, Iterable, Iterator, AsyncIterator, BinaryIO
+from pydantic import ValidationError
+from schemas.models import Invoice, Product, Customer
+
+# Control characters XML 1.0 does not allow in cell text
+ILLEGAL_XML_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Schema each exported row is validated against
+EXPORT_MODELS = {
+    'invoices': Invoice,
+    'products': Product,
+    'customers': Customer,
+}
+
+# Column order for each exported entity
+EXPORT_FIELDS = {entity: list(model.model_fields) for entity, model in EXPORT_MODELS.items()}
+
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),
+    'csv': ('text/csv', '.csv'),
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+}
+
+# Rows buffered before a chunk is sent to the client
+EXPORT_CHUNK_ROWS = 500
+EXPORT_READ_CHUNK_BYTES = 64 * 1024
+# Longest NDJSON line accepted in an export request body
+EXPORT_MAX_LINE_BYTES = 1024 * 1024
+
+
+async def spool_export_rows(chunks: AsyncIterator[bytes], entities: List[str]) -> Dict[str, str]:
+    """Validate an NDJSON request body line by line into one temp file per entity
+
+    Lines need a "type" key naming the entity unless only one entity is
+    exported. Only one line is held in memory at a time. Returns
+    entity -> temp file path; on a bad line the files are removed and
+    ValueError names the line.
+    """
+    paths = {}
+    files = {}
+    try:
+        for entity in entities:
+            fd, paths[entity] = tempfile.mkstemp(suffix='.ndjson')
+            files[entity] = os.fdopen(fd, 'w', encoding='utf-8')
+
+        line_number = 0
+        pending = b''
+        async for chunk in chunks:
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            if len(pending) > EXPORT_MAX_LINE_BYTES:
+                raise ValueError(f"Line {line_number + len(lines) + 1}: longer than {EXPORT_MAX_LINE_BYTES} bytes")
+            for line in lines:
+                line_number += 1
+                _spool_line(files, entities, line, line_number)
+        if pending:
+            _spool_line(files, entities, pending, line_number + 1)
+
+        for f in files.values():
+            f.close()
+        return paths
+    except Exception:
+        for f in files.values():
+            f.close()
+        remove_spooled_rows(paths)
+        raise
+
+
+def _spool_line(files: Dict[str, Any], entities: List[str], line: bytes, line_number: int) -> None:
+    if not line.strip():
+        return
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Line {line_number}: invalid JSON ({str(e)})")
+    if not isinstance(record, dict):
+        raise ValueError(f"Line {line_number}: expected a JSON object")
+
+    entity = record.pop('type', None) or (entities[0] if len(entities) == 1 else None)
+    if entity not in files:
+        raise ValueError(f"Line {line_number}: \"type\" must be one of {', '.join(entities)}")
+
+    try:
+        row = EXPORT_MODELS[entity].model_validate(record)
+    except ValidationError as e:
+        raise ValueError(f"Line {line_number}: {str(e)}")
+    files[entity].write(row.model_dump_json() + "\n")
+
+
+def iter_spooled_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Read validated rows back from a spool file one at a time"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def remove_spooled_rows(paths: Dict[str, str]) -> None:
+    for path in paths.values():
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[bytes]:
+    """Stream rows as CSV, one chunk per EXPORT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(sections: Dict[str, Iterable[Dict[str, Any]]]) -> Iterator[bytes]:
+    """Stream rows as newline-delimited JSON; a "type" key marks the entity when exporting several"""
+    tagged = len(sections) > 1
+    lines = []
+
+    for entity, rows in sections.items():
+        fields = EXPORT_FIELDS[entity]
+        for row in rows:
+            record = {field: row.get(field) for field in fields}
+            if tagged:
+                record = {'type': entity, **record}
+            lines.append(json.dumps(record, default=str))
+            if len(lines) >= EXPORT_CHUNK_ROWS:
+                yield ("\n".join(lines) + "\n").encode('utf-8')
+                lines = []
+
+    if lines:
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+# Minimal SpreadsheetML parts; sheets use inline strings so no shared
+# string table has to be built before rows are written
+XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XLSX_PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XLSX_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+XLSX_STYLES = (
+    f'{XLSX_XML_HEAD}<styleSheet xmlns="{XLSX_MAIN_NS}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def write_xlsx(sections: Dict[str, Iterable[Dict[str, Any]]], out: BinaryIO) -> None:
+    """Write one sheet per entity as an XLSX file to a binary stream
+
+    Rows are compressed straight into the zip as they are read, so output
+    starts with the first rows (openpyxl's write-only mode keeps each
+    sheet in a temp file until the workbook is saved). ``out`` does not
+    need to be seekable.
+    """
+    titles = [entity.capitalize() for entity in sections]
+
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for number, (entity, rows) in enumerate(sections.items(), start=1):
+            fields = EXPORT_FIELDS[entity]
+            with archive.open(f'xl/worksheets/sheet{number}.xml', 'w') as sheet:
+                chunk = [f'{XLSX_XML_HEAD}<worksheet xmlns="{XLSX_MAIN_NS}"><sheetData>', _xlsx_row(1, fields)]
+                for row_number, row in enumerate(rows, start=2):
+                    chunk.append(_xlsx_row(row_number, [row.get(field) for field in fields]))
+                    if len(chunk) >= EXPORT_CHUNK_ROWS:
+                        sheet.write("".join(chunk).encode('utf-8'))
+                        chunk = []
+                chunk.append('</sheetData></worksheet>')
+                sheet.write("".join(chunk).encode('utf-8'))
+
+        sheet_range = range(1, len(titles) + 1)
+        archive.writestr('[Content_Types].xml', (
+            f'{XLSX_XML_HEAD}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for number in sheet_range
+            )
+            + '</Types>'
+        ))
+        archive.writestr('_rels/.rels', (
+            f'{XLSX_XML_HEAD}<Relationships xmlns="{XLSX_PACKAGE_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{XLSX_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/workbook.xml', (
+            f'{XLSX_XML_HEAD}<workbook xmlns="{XLSX_MAIN_NS}" xmlns:r="{XLSX_REL_NS}"><sheets>'
+            + "".join(
+                f'<sheet name="{title}" sheetId="{number}" r:id="rId{number}"/>'
+                for number, title in zip(sheet_range, titles)
+            )
+            + '</sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            f'{XLSX_XML_HEAD}<Relationships xmlns="{XLSX_PACKAGE_REL_NS}">'
+            + "".join(
+                f'<Relationship Id="rId{number}" Type="{XLSX_REL_NS}/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>'
+                for number in sheet_range
+            )
+            + f'<Relationship Id="rId{len(titles) + 1}" Type="{XLSX_REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+
+
+def _xlsx_row(row_number: int, values: List[Any]) -> str:
+    cells = []
+    for column, value in enumerate(values):
+        if value is None:
+            continue
+        ref = f'{_xlsx_column(column)}{row_number}'
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)) and math.isfinite(value):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            text = escape(ILLEGAL_XML_CHARACTERS.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+
+def _xlsx_column(index: int) -> str:
+    """Zero-based column index to a column letter (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _write_xlsx_to_pipe(sections: Dict[str, Iterable[Dict[str, Any]]], write_fd: int) -> None:
+    try:
+        with os.fdopen(write_fd, 'wb') as out:
+            write_xlsx(sections, out)
+    except BrokenPipeError:
+        print("DEBUG: XLSX export download closed, stopping writer")
+
+
+async def iter_xlsx(sections: Dict[str, Iterable[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Write the workbook in a thread and stream it through a pipe as it is produced"""
+    read_fd, write_fd = os.pipe()
+    writer = asyncio.ensure_future(asyncio.to_thread(_write_xlsx_to_pipe, sections, write_fd))
+    try:
+        while chunk := await asyncio.to_thread(os.read, read_fd, EXPORT_READ_CHUNK_BYTES):
+            yield chunk
+        # Raise writer errors rather than ending a truncated download normally
+        await writer
+    finally:
+        # With the read end closed, a writer still running (client went
+        # away) fails with BrokenPipeError on its next write and stops
+        os.close(read_fd)
+        writer.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+
+def build_export(sections: Dict[str, Iterable[Dict[str, Any]]], export_format: str):
+    """Return (body iterator, media type, file extension) for a streamed export"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    for entity in sections:
+        if entity not in EXPORT_FIELDS:
+            raise ValueError(f"Unsupported export entity: {entity}")
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+
+    if export_format == 'xlsx':
+        body = iter_xlsx(sections)
+    elif export_format == 'csv':
+        if len(sections) != 1:
+            raise ValueError("CSV export supports one entity at a time")
+        entity, rows = next(iter(sections.items()))
+        body = iter_csv(rows, EXPORT_FIELDS[entity])
+    else:
+        body = iter_ndjson(sections)
+
+    return body, media_type, extension
@@ -1,12 +1,14 @@
-from typing import Dict, Any
+from typing import Dict, List, Any
 from services.excel_parser import parse_excel
 from services.ai_extractor import extract_with_ai
+from services.batch_extractor import extract_batch_with_ai
+from services.executor import ExecutorBusyError
 
 async def process_file(file_path: str, file_ext: str) -> Dict[str, Any]:
     """Main extraction pipeline"""
     try:
         if file_ext in ['.xlsx', '.xls']:
-            extracted_data = parse_excel(file_path)
+            extracted_data = await parse_excel(file_path)
         elif file_ext in ['.pdf', '.png', '.jpg', '.jpeg']:
             extracted_data = await extract_with_ai(file_path, file_ext)
         else:
@@ -20,6 +22,8 @@ async def process_file(file_path: str, file_ext: str) -> Dict[str, Any]:
             "message": f"Successfully extracted {len(extracted_data.get('invoices', []))} invoices"
         }
         
+    except ExecutorBusyError:
+        raise
     except Exception as e:
         return {
             "invoices": [],
@@ -27,4 +31,53 @@ async def process_file(file_path: str, file_ext: str) -> Dict[str, Any]:
             "customers": [],
             "success": False,
             "message": f"Extraction failed: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+async def process_batch(files: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Batch extraction pipeline; small images/PDFs share model calls"""
+    ai_files = [item for item in files if item['file_ext'] in ['.pdf', '.png', '.jpg', '.jpeg']]
+    ai_results = iter(await extract_batch_with_ai(ai_files)) if ai_files else iter([])
+    
+    results = []
+    for item in files:
+        if item in ai_files:
+            extracted_data = next(ai_results)
+            if 'error' in extracted_data:
+                result = {
+                    "invoices": [],
+                    "products": [],
+                    "customers": [],
+                    "success": False,
+                    "message": f"Extraction failed: {extracted_data['error']}"
+                }
+            else:
+                result = {
+                    "invoices": extracted_data.get('invoices', []),
+                    "products": extracted_data.get('products', []),
+                    "customers": extracted_data.get('customers', []),
+                    "success": True,
+                    "message": f"Successfully extracted {len(extracted_data.get('invoices', []))} invoices"
+                }
+        else:
+            try:
+                result = await process_file(item['file_path'], item['file_ext'])
+            except ExecutorBusyError as e:
+                # Report busy for this file only; the rest of the batch may
+                # already have used model quota
+                result = {
+                    "invoices": [],
+                    "products": [],
+                    "customers": [],
+                    "success": False,
+                    "message": f"Extraction failed: {str(e)}"
+                }
+        
+        result['filename'] = item['filename']
+        results.append(result)
+    
+    succeeded = sum(1 for result in results if result['success'])
+    return {
+        "results": results,
+        "success": succeeded == len(results),
+        "message": f"Successfully processed {succeeded} of {len(results)} files"
+    }
@@ -0,0 +1,122 @@
+import os
+import json
+from typing import Dict, Any, Iterator
+from services.excel_parser import (
+    iter_excel_invoices,
+    new_aggregates,
+    add_to_aggregates,
+    finish_aggregates,
+)
+from services.executor import ExecutorBusyError
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+# Invoices buffered before a chunk is sent to the client
+STREAM_CHUNK_ROWS = 500
+
+# Streams parse in the app process, so limit how many run at once
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", 2))
+
+_active_streams = 0
+
+
+def acquire_stream_slot() -> None:
+    """Reserve a stream slot, or raise ExecutorBusyError when all are taken"""
+    global _active_streams
+    if _active_streams >= STREAM_MAX_CONCURRENT:
+        print(f"DEBUG: {_active_streams} streams running, rejecting new stream")
+        raise ExecutorBusyError()
+    _active_streams += 1
+
+
+def release_stream_slot() -> None:
+    global _active_streams
+    _active_streams -= 1
+
+
+def stream_excel_extraction(file_path: str, stream_format: str) -> Iterator[bytes]:
+    """Stream a manual spreadsheet extraction as NDJSON or chunked JSON
+
+    Invoices are sent as they are read from the workbook; products,
+    customers and the summary are kept as running totals and sent last.
+    """
+    if stream_format == 'ndjson':
+        return _stream_ndjson(file_path)
+    if stream_format == 'json':
+        return _stream_json(file_path)
+    raise ValueError(f"Unsupported stream format: {stream_format}")
+
+
+def _stream_ndjson(file_path: str) -> Iterator[bytes]:
+    """One line per record: invoices, then products, customers, summary and a final result line"""
+    aggregates = new_aggregates()
+    count = 0
+    lines = []
+
+    try:
+        for invoice, unit_price in iter_excel_invoices(file_path):
+            add_to_aggregates(aggregates, invoice, unit_price)
+            lines.append(_ndjson_line('invoices', invoice))
+            count += 1
+            if len(lines) >= STREAM_CHUNK_ROWS:
+                yield "".join(lines).encode('utf-8')
+                lines = []
+
+        totals = finish_aggregates(aggregates)
+        for product in totals['products']:
+            lines.append(_ndjson_line('products', product))
+        for customer in totals['customers']:
+            lines.append(_ndjson_line('customers', customer))
+        lines.append(_ndjson_line('summary', totals['summary']))
+        lines.append(_ndjson_line('result', {
+            'success': True,
+            'message': f"Successfully extracted {count} invoices"
+        }))
+    except Exception as e:
+        lines.append(_ndjson_line('result', {
+            'success': False,
+            'message': f"Extraction failed: Manual Excel parsing error: {str(e)}"
+        }))
+
+    yield "".join(lines).encode('utf-8')
+
+
+def _stream_json(file_path: str) -> Iterator[bytes]:
+    """Same shape as /api/upload, with the invoices array written incrementally"""
+    aggregates = new_aggregates()
+    count = 0
+    items = []
+
+    yield b'{"invoices": ['
+    try:
+        for invoice, unit_price in iter_excel_invoices(file_path):
+            add_to_aggregates(aggregates, invoice, unit_price)
+            items.append(json.dumps(invoice, default=str))
+            count += 1
+            if len(items) >= STREAM_CHUNK_ROWS:
+                yield (("" if count == len(items) else ", ") + ", ".join(items)).encode('utf-8')
+                items = []
+
+        totals = finish_aggregates(aggregates)
+        success, message = True, f"Successfully extracted {count} invoices"
+    except Exception as e:
+        totals = {'products': [], 'customers': [], 'summary': {}}
+        success, message = False, f"Extraction failed: Manual Excel parsing error: {str(e)}"
+
+    head = "" if count == len(items) else ", "
+    tail = {
+        'products': totals['products'],
+        'customers': totals['customers'],
+        'summary': totals['summary'],
+        'success': success,
+        'message': message
+    }
+    # Splice the remaining keys onto the open object
+    yield ((head + ", ".join(items) if items else "") + "], " + json.dumps(tail, default=str)[1:]).encode('utf-8')
+
+
+def _ndjson_line(record_type: str, record: Dict[str, Any]) -> str:
+    return json.dumps({'type': record_type, **record}, default=str) + "\n"